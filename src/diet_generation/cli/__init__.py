@@ -1,8 +1,11 @@
 import typer
 
-from diet_generation.cli import diet_cmd, exercises_cmd, user_cmd
+from diet_generation.cli import diet_cmd, exercises_cmd, jobs_cmd, loadtest_cmd, server_cmd, user_cmd
 
 app = typer.Typer()
 app.add_typer(diet_cmd.app, name="diet")
 app.add_typer(exercises_cmd.app, name="exercises")
 app.add_typer(user_cmd.app, name="user")
+app.add_typer(server_cmd.app, name="server")
+app.add_typer(jobs_cmd.app, name="jobs")
+app.add_typer(loadtest_cmd.app, name="loadtest")
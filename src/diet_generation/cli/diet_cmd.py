@@ -1,3 +1,4 @@
+from pathlib import Path
 from typing import Literal, Optional
 import typer
 import logging
@@ -63,3 +64,41 @@ def generate_food_database() -> None:
     
     db_generator.generate(search_terms=search_terms)
 
+
+@app.command("sync-food-db")
+def sync_food_database(
+    max_age_days: Optional[int] = typer.Option(None, min=0, help="Defaults to `food_db_max_age_days` in settings"),
+    budget: Optional[int] = typer.Option(None, min=1, help="Defaults to `food_db_sync_budget` in settings"),
+) -> None:
+    """
+    Endpoint to refresh the food database incrementally. Only the entries
+    fetched more than `max-age-days` ago (or never timestamped) are fetched
+    again from FatSecret, with up to `budget` requests, and updated in place.
+    """
+    db_generator = FoodDatabaseGenerator()
+    stats = db_generator.sync(max_age_days=max_age_days, budget=budget)
+    typer.echo(f"Changed: {stats['changed']}, unchanged: {stats['unchanged']}, " \
+               f"failed: {stats['failed']}, deferred: {stats['deferred']}")
+
+
+@app.command("seed-food-db")
+def seed_food_database(
+    terms_file: Path = typer.Argument(..., exists=True, dir_okay=False,
+                                      help="Text file with one search term per line"),
+    chunk_size: int = typer.Option(50, min=1, help="Terms processed between writes to the database"),
+    retry_failed: bool = typer.Option(False, help="Search again the terms that failed in previous runs"),
+    checkpoint: Optional[Path] = typer.Option(None, help="Defaults to `food_seed_checkpoint_file` in settings"),
+) -> None:
+    """
+    Endpoint to add to the food database the foods of a large list of
+    search terms. The run can be interrupted and restarted at any time:
+    the terms already resolved are never searched again.
+    """
+    with terms_file.open(encoding="utf-8") as f:
+        search_terms = [line for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+    db_generator = FoodDatabaseGenerator()
+    stats = db_generator.seed(search_terms, checkpoint_path=checkpoint,
+                              chunk_size=chunk_size, retry_failed=retry_failed)
+    typer.echo(f"Resolved: {stats['resolved']}, failed: {stats['failed']}, " \
+               f"skipped: {stats['skipped']}")
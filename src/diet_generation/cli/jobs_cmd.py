@@ -0,0 +1,76 @@
+import json
+from pathlib import Path
+from typing import Optional
+import typer
+import logging
+
+from diet_generation.service.jobs import JobQueue, QueueFullError, run_workers
+
+
+logging.basicConfig(level=logging.INFO)
+app = typer.Typer(help="Endpoints related to the queue of meals plan generation jobs")
+
+
+@app.command("submit")
+def submit_job(
+    user_file: Path = typer.Argument(..., exists=True, dir_okay=False,
+                                     help="JSON file with the user's data"),
+) -> None:
+    """
+    Enqueues the generation of a meals plan for the user described in the
+    JSON file (same fields as `diet generate-meals-plan`), and prints the id
+    of the job.
+    """
+    queue = JobQueue()
+    try:
+        job_id = queue.submit(json.loads(user_file.read_text(encoding="utf-8")))
+    except QueueFullError as e:
+        typer.echo(str(e), err=True)
+        raise typer.Exit(code=1)
+    except (KeyError, ValueError, TypeError) as e:
+        # also covers a file that isn't valid JSON (JSONDecodeError is a ValueError)
+        typer.echo(f"Invalid user data in {user_file}: {e!r}", err=True)
+        raise typer.Exit(code=1)
+    finally:
+        queue.close()
+    typer.echo(job_id)
+
+
+@app.command("status")
+def job_status(job_id: str) -> None:
+    """Prints the status and number of attempts of a job."""
+    queue = JobQueue()
+    job = queue.get(job_id)
+    queue.close()
+    if job is None:
+        typer.echo(f"Job {job_id} not found", err=True)
+        raise typer.Exit(code=1)
+
+    typer.echo(f"{job.status} (attempts: {job.attempts})")
+    if job.error:
+        typer.echo(f"Last error: {job.error}")
+
+
+@app.command("result")
+def job_result(job_id: str) -> None:
+    """Prints the generated meals plan of a finished job as JSON."""
+    queue = JobQueue()
+    job = queue.get(job_id)
+    queue.close()
+    if job is None or job.status != "done":
+        status = job.status if job else "not found"
+        typer.echo(f"Job {job_id} has no result yet ({status})", err=True)
+        raise typer.Exit(code=1)
+
+    typer.echo(json.dumps(job.result, indent=2, ensure_ascii=False))
+
+
+@app.command("work")
+def work(
+    workers: Optional[int] = typer.Option(None, min=1, help="Defaults to `job_workers` in settings"),
+) -> None:
+    """
+    Starts the worker processes that generate the plans of the queued jobs,
+    retrying the failed ones with backoff.
+    """
+    run_workers(workers=workers)
@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+import typer
+import logging
+
+from diet_generation.loadtest.driver import record, run_load
+
+
+logging.basicConfig(level=logging.INFO)
+app = typer.Typer(help="Endpoints related to offline load testing of the diet pipeline")
+
+
+@app.command("record")
+def record_interactions(
+    cassette: Path = typer.Argument(..., help="JSON lines file where the interactions are stored"),
+    samples: int = typer.Option(3, min=1, help="Number of synthetic users run against the real APIs"),
+    seed: int = typer.Option(0),
+) -> None:
+    """
+    Runs the diet pipeline against OpenAI and FatSecret for a few synthetic
+    users, recording every interaction (and its latency) in the cassette.
+    """
+    summary = record(cassette, samples=samples, seed=seed)
+    typer.echo(json.dumps(summary, indent=2))
+
+
+@app.command("run")
+def run_load_test(
+    cassette: Path = typer.Argument(..., exists=True, dir_okay=False),
+    users: int = typer.Option(10, min=1, help="Concurrent synthetic users"),
+    requests: int = typer.Option(100, min=1, help="Total pipelines to run"),
+    latency_scale: float = typer.Option(1.0, min=0.0, help="Multiplier of the recorded latencies"),
+    seed: int = typer.Option(0),
+) -> None:
+    """
+    Runs the full diet pipeline under load, serving the LLM and FatSecret
+    from the recorded cassette, and reports the throughput and the
+    p50/p95/p99 latency of each stage.
+    """
+    report = run_load(cassette, users=users, requests=requests,
+                      latency_scale=latency_scale, seed=seed)
+    typer.echo(json.dumps(report, indent=2))
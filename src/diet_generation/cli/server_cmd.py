@@ -0,0 +1,22 @@
+import typer
+import logging
+
+from diet_generation.service.server import serve
+
+
+logging.basicConfig(level=logging.INFO)
+app = typer.Typer(help="Endpoints related to the long-lived plan generation service")
+
+
+@app.command("serve")
+def serve_plans(
+    host: str = typer.Option("127.0.0.1"),
+    port: int = typer.Option(8000),
+) -> None:
+    """
+    Starts an HTTP service that keeps the food database and API clients
+    in memory. It exposes `POST /meals-plan` and `POST /macros` (both take
+    the user's data as JSON), `GET /stats` with the latency percentiles
+    of each endpoint and `GET /health`.
+    """
+    serve(host=host, port=port)
@@ -1,6 +1,50 @@
+import json
+from dataclasses import asdict
+from pathlib import Path
+from typing import Optional
 import typer
 import logging
 
+from diet_generation.pipelines.form_ingestion import FormIngestion
+from diet_generation.service.jobs import JobQueue, QueueFullError
+from diet_generation.user.types import UserData
+
 
 logging.basicConfig(level=logging.INFO)
-app = typer.Typer(help="Endpoints related to meals plan (diet) generation")
+app = typer.Typer(help="Endpoints related to the users (clients) information")
+
+
+@app.command("ingest-form")
+def ingest_form(
+    csv_file: Path = typer.Argument(..., exists=True, dir_okay=False,
+                                    help="CSV export of the Google Form"),
+    columns_file: Optional[Path] = typer.Option(None, exists=True, dir_okay=False,
+                                                help="JSON mapping of UserData fields to form columns"),
+    state_file: Optional[Path] = typer.Option(None, help="Defaults to `form_ingestion_state_file` in settings"),
+) -> None:
+    """
+    Reads the Google Form export and enqueues a meals plan generation job
+    for every answer that is new or was edited since the last run. Run
+    `jobs work` to process them.
+    """
+    columns = json.loads(columns_file.read_text(encoding="utf-8")) if columns_file else None
+    ingestion = FormIngestion(csv_file, columns=columns, state_path=state_file)
+
+    queue = JobQueue()
+    enqueued = 0
+
+    def submit(user_data: UserData) -> None:
+        nonlocal enqueued
+        queue.submit(asdict(user_data))
+        enqueued += 1
+
+    try:
+        stats = ingestion.run(submit)
+    except QueueFullError as e:
+        # the answers not enqueued yet are picked up by the next run
+        typer.echo(f"{e} Enqueued {enqueued} answers before the queue filled up, " \
+                   f"run `ingest-form` again once the workers catch up.", err=True)
+        raise typer.Exit(code=1)
+    finally:
+        queue.close()
+    typer.echo(f"Enqueued: {stats['processed']}, invalid: {stats['invalid']}")
@@ -24,12 +24,29 @@ class Settings(BaseSettings):
     food_db_client_id: str = Field(..., env="FOOD_DB_CLIENT_ID")
     food_db_client_secret: str = Field(..., env="FOOD_DB_CLIENT_SECRET")
     food_database_file: Path = databases_dir / "food.csv"
+    food_db_max_age_days: int = 30          # entries fetched before this are refreshed
+    food_db_sync_budget: int = 200          # max. FatSecret requests per incremental sync
+    food_seed_checkpoint_file: Path = databases_dir / "food_seed_checkpoint.jsonl"
+    food_db_shared_snapshot: bool = True    # share a memory-mapped copy of the db between processes
+    food_db_shared_dir: Path = databases_dir / "shared"
     
     # Exercise Database
     exercises_database_file: Path = databases_dir / "exercises.csv"
 
     # OpenAI
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
+    llm_plan_candidates: int = 1            # > 1 asks for several plans and keeps the best
+
+    # Google Form ingestion
+    form_ingestion_state_file: Path = databases_dir / "form_ingestion_state.json"
+
+    # Job queue
+    jobs_database_file: Path = databases_dir / "jobs.sqlite3"
+    job_workers: int = 2
+    job_max_attempts: int = 4
+    job_retry_backoff_seconds: float = 5.0
+    job_lease_seconds: float = 600.0        # a running job older than this is considered crashed
+    job_max_pending: int = 500               # submissions are rejected above this queue depth
 
 
 @lru_cache
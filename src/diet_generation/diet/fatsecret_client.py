@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from diet_generation.config.settings import get_settings
+
+log = logging.getLogger(__name__)
+
+
+class FatSecretClient:
+    """
+    Minimal FatSecret REST client meant to be shared by the whole process.
+
+    It keeps one keep-alive HTTP session (with a connection pool) and one
+    OAuth 2.0 access token, which is refreshed shortly before it expires,
+    so each lookup costs a single request instead of a full handshake.
+    It's safe to use from several threads at the same time.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        *,
+        api_url: str,
+        token_url: str,
+        pool_size: int = 10,
+        refresh_margin: float = 300.0,
+        timeout: float = 30.0,
+    ) -> "FatSecretClient":
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_url = api_url
+        self.token_url = token_url
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token: Optional[str] = None
+        self._token_expires_at: float = 0.0
+        self._token_lock = threading.Lock()
+
+
+    def _fetch_token(self) -> None:
+        response = self.session.post(
+            self.token_url,
+            data={"grant_type": "client_credentials", "scope": "basic"},
+            auth=(self.client_id, self.client_secret),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        token_data = response.json()
+        self._token = token_data["access_token"]
+        self._token_expires_at = time.monotonic() + float(token_data.get("expires_in", 0))
+        log.info("Fetched a new FatSecret access token")
+
+
+    def _access_token(self, force_refresh: bool = False) -> str:
+        """
+        Returns the cached access token, fetching a new one (only once
+        when several threads need it) if it's missing or about to expire.
+        """
+        with self._token_lock:
+            expiring = time.monotonic() >= self._token_expires_at - self.refresh_margin
+            if force_refresh or self._token is None or expiring:
+                self._fetch_token()
+            return self._token
+
+
+    def request(self, method: str, **params: Any) -> Dict[str, Any]:
+        """
+        Calls a method of the FatSecret API and returns its JSON response.
+        If the token was rejected it's refreshed and the call is retried once.
+        """
+        params = {key: value for key, value in params.items() if value is not None}
+        params.update({"method": method, "format": "json"})
+
+        token = self._access_token()
+        for retry in (False, True):
+            response = self.session.post(
+                self.api_url,
+                headers={"Authorization": f"Bearer {token}"},
+                params=params,
+                timeout=self.timeout,
+            )
+            if response.status_code == 401 and not retry:
+                token = self._access_token(force_refresh=True)
+                continue
+            response.raise_for_status()
+            return response.json()
+
+
+    def foods_search(self, search_expression: str, max_results: int | None = None) -> Dict[str, Any]:
+        return self.request("foods.search", search_expression=search_expression,
+                            max_results=max_results)
+
+
+    def food_get_v4(self, food_id: str | int) -> Dict[str, Any]:
+        return self.request("food.get.v4", food_id=food_id)
+
+
+_client: FatSecretClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_fatsecret_client() -> FatSecretClient:
+    """
+    Returns the FatSecret client shared by every food lookup in the process.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            settings = get_settings()
+            _client = FatSecretClient(
+                client_id=settings.food_db_client_id,
+                client_secret=settings.food_db_client_secret,
+                api_url=settings.food_database_api,
+                token_url=settings.api_access_token_url,
+            )
+        return _client
+
+
+def set_fatsecret_client(client: FatSecretClient | None) -> FatSecretClient | None:
+    """
+    Replaces the shared client (e.g. by a recording or replaying stand-in)
+    and returns the previous one, so it can be restored. Passing None goes
+    back to the default client.
+    """
+    global _client
+    with _client_lock:
+        previous, _client = _client, client
+        return previous
@@ -1,25 +1,49 @@
 from __future__ import annotations
 
+import json
 import logging
-from typing import Any, Dict, List, Optional
+import re
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import pandas as pd
-from dataclasses import asdict
-from pyfatsecret import Fatsecret
+from dataclasses import asdict, fields
 
 from diet_generation.config.settings import get_settings
+from diet_generation.diet.fatsecret_client import FatSecretClient, get_fatsecret_client
 from diet_generation.diet.types import FoodItem
+from diet_generation.utils.io import _food_database_write_lock, _write_food_database
 
 log = logging.getLogger(__name__)
 
+# columns compared to decide whether a refreshed entry actually changed
+NUTRIENT_COLUMNS = [
+    f.name for f in fields(FoodItem) if f.name not in ("name", "food_id", "fetched_at")
+]
+
+
+class _LookupBudgetExhausted(Exception):
+    """
+    Raised when a search runs out of its FatSecret lookups before finding
+    the food, so it's retried later instead of counted as a failure.
+    """
+
+
+def normalize_term(term: str) -> str:
+    """
+    Normalizes a search term (unicode form, case and whitespace), so the
+    same food written in slightly different ways is searched only once.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", term)).strip().lower()
+
 
 class FoodDatabaseGenerator:
     def __init__(self):
         settings = get_settings()
-        self.fs = Fatsecret(
-            client_id=settings.food_db_client_id,
-            client_secret=settings.food_db_client_secret
-        )
+        self.fs: FatSecretClient = get_fatsecret_client()
         self.db_path = settings.food_database_file
+        self.lookups = 0    # FatSecret requests made, sync() budgets them
 
 
     def _try_float(self, value: str | None) -> Optional[float]:
@@ -78,27 +102,35 @@ class FoodDatabaseGenerator:
                 vitamin_c=self._try_float(serving.get("vitamin_c")),
                 vitamin_d=self._try_float(serving.get("vitamin_d")),
                 added_sugars=self._try_float(serving.get("added_sugars")),
+
+                food_id=int(food_data["food_id"]) if food_data.get("food_id") else None,
+                fetched_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
             )
         except Exception as e:
             log.warning(f"Failed to parse food item: {e}")
             return None
         
     
-    def _search_food(self, food_name: str) -> FoodItem | None:
+    def _search_food(self, food_name: str, max_lookups: int | None = None) -> FoodItem | None:
         """
         Tries to obtain the best match for the food we're looking for
-        in the database of FatSecret.
+        in the database of FatSecret. When `max_lookups` is given, the
+        search raises _LookupBudgetExhausted once `self.lookups` reaches it.
 
         It returns the food item if it founds it, else None.
         """
         try:
-            search_results = self.fs.foods.foods_search(food_name)
+            self.lookups += 1
+            search_results = self.fs.foods_search(food_name)
             food_list = search_results.get("foods", {}).get("food", [])
             log.info(f"Food list: {search_results.get('foods')}")
 
             for item in food_list:
+                if max_lookups is not None and self.lookups >= max_lookups:
+                    raise _LookupBudgetExhausted(food_name)
                 food_id = item.get("food_id")
-                detail = self.fs.foods.food_get_v4(food_id)
+                self.lookups += 1
+                detail = self.fs.food_get_v4(food_id)
                 food_dict: Dict[str, Any] = detail.get("food")
                 food_type: str = detail.get("food_type")
                 log.info(f"Food type: {food_type}")
@@ -120,11 +152,31 @@ class FoodDatabaseGenerator:
                     log.info(f"Parsed: {food_item}")
                     return food_item
 
+        except _LookupBudgetExhausted:
+            raise
         except Exception as e:
             log.warning(f"Failed to retrieve or parse foods for '{food_name}': {e}")
             return None
 
 
+    def _fetch_food(self, food_id: int) -> FoodItem | None:
+        """
+        Fetches the current information of an already known food by its
+        FatSecret id, which takes a single request instead of a search.
+        """
+        try:
+            self.lookups += 1
+            detail = self.fs.food_get_v4(food_id)
+            food_dict: Dict[str, Any] | None = detail.get("food")
+            if not food_dict:
+                log.info(f"Detail of not found item: {detail}")
+                return None
+            return self._parse_food_item(food_dict)
+        except Exception as e:
+            log.warning(f"Failed to retrieve or parse food {food_id}: {e}")
+            return None
+
+
     def generate(self, search_terms: List[str]) -> None:
         """
         Generates and saves a food database using FatSecret API v4.
@@ -142,7 +194,8 @@ class FoodDatabaseGenerator:
                 log.warning(f"The food information for {term} wasn't found.")
 
         df = pd.DataFrame(asdict(food) for food in all_foods)
-        df.to_csv(self.db_path, index=False)
+        with _food_database_write_lock():
+            _write_food_database(df)
         log.info(f"Saved {len(df)} items to {self.db_path}")
 
 
@@ -166,7 +219,228 @@ class FoodDatabaseGenerator:
                         f"or the food must be replaced.")
             return False
 
-        new_row = pd.DataFrame([asdict(food_item)])
-        df_food = pd.concat([df_food, new_row], ignore_index=True)
-        df_food.to_csv(self.db_path, index=False)
+        with _food_database_write_lock():
+            # re-reads the db, another thread or process may have added foods meanwhile
+            df_food = pd.read_csv(self.db_path)
+            names = df_food["name"].str.lower()
+            if names.isin([name.lower(), food_item.name.lower()]).any():
+                log.info(f"'{name}' was added to the database meanwhile")
+                return True
+
+            new_row = pd.DataFrame([asdict(food_item)])
+            df_food = pd.concat([df_food, new_row], ignore_index=True)
+            _write_food_database(df_food)
         return True
+
+
+    def _stale_rows(self, df_food: pd.DataFrame, max_age_days: int) -> pd.DataFrame:
+        """
+        Returns the rows that must be refreshed (never fetched with a
+        timestamp, or fetched more than `max_age_days` ago), oldest first.
+        """
+        fetched_at = pd.to_datetime(df_food.get("fetched_at"), utc=True, errors="coerce")
+        if fetched_at is None:
+            fetched_at = pd.Series(pd.NaT, index=df_food.index, dtype="datetime64[ns, UTC]")
+
+        cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        stale = fetched_at.isna() | (fetched_at < cutoff)
+        order = fetched_at[stale].sort_values(na_position="first").index
+        return df_food.loc[order]
+
+
+    def _has_changed(self, row: pd.Series, food_item: FoodItem) -> bool:
+        new_values = asdict(food_item)
+        for column in NUTRIENT_COLUMNS:
+            old, new = row.get(column), new_values[column]
+            old_missing, new_missing = pd.isna(old), new is None
+            if old_missing or new_missing:
+                if old_missing != new_missing:
+                    return True
+            elif old != new and not (isinstance(new, float) and abs(float(old) - new) < 1e-9):
+                return True
+        return False
+
+
+    def sync(self, max_age_days: int | None = None, budget: int | None = None) -> Dict[str, int]:
+        """
+        Refreshes the stale entries of the database incrementally, instead
+        of regenerating it. Entries are fetched oldest first, each one by
+        its FatSecret `food_id` when it's known (legacy rows are searched
+        by name and get their id recorded), until `budget` FatSecret
+        requests were made. Rows sharing a name are fetched once.
+
+        Only the rows that were fetched are updated in place; the rest of
+        the database is left untouched. Returns how many entries were
+        changed, unchanged (only their timestamp moves), failed, and
+        deferred to the next sync because the budget ran out.
+        """
+        settings = get_settings()
+        max_age_days = settings.food_db_max_age_days if max_age_days is None else max_age_days
+        budget = settings.food_db_sync_budget if budget is None else budget
+
+        stale = self._stale_rows(pd.read_csv(self.db_path), max_age_days)
+        stale = stale[~stale["name"].str.lower().duplicated()]
+        log.info(f"{len(stale)} stale food entries, refreshing them with up to {budget} lookups")
+
+        max_lookups = self.lookups + budget
+        refreshed: Dict[str, tuple[FoodItem, bool]] = {}
+        stats = {"changed": 0, "unchanged": 0, "failed": 0, "deferred": 0}
+        for i, (_, row) in enumerate(stale.iterrows()):
+            if self.lookups >= max_lookups:
+                stats["deferred"] = len(stale) - i
+                break
+            food_id = row.get("food_id")
+            try:
+                if pd.notna(food_id):
+                    food_item = self._fetch_food(int(food_id))
+                else:
+                    food_item = self._search_food(row["name"], max_lookups=max_lookups)
+            except _LookupBudgetExhausted:
+                # cut off midway, this entry and the rest are retried next time
+                stats["deferred"] = len(stale) - i
+                break
+
+            if food_item is None:
+                stats["failed"] += 1
+                log.warning(f"Couldn't refresh '{row['name']}', keeping the current entry")
+                continue
+
+            changed = self._has_changed(row, food_item)
+            stats["changed" if changed else "unchanged"] += 1
+            refreshed[row["name"].lower()] = (food_item, changed)
+
+        if stats["deferred"]:
+            log.info(f"Lookup budget exhausted, {stats['deferred']} entries are left for the next sync")
+        if not refreshed:
+            return stats
+
+        with _food_database_write_lock():
+            # re-reads the db so rows added meanwhile aren't lost
+            df_food = pd.read_csv(self.db_path)
+            for column in ("food_id", "fetched_at"):
+                if column not in df_food.columns:
+                    df_food[column] = None
+            # text columns that are empty everywhere are read as floats
+            for column in ("serving_description", "fetched_at"):
+                df_food[column] = df_food[column].astype(object)
+
+            keys = df_food["name"].str.lower()
+            for key, (food_item, changed) in refreshed.items():
+                mask = keys == key
+                new_values = asdict(food_item)
+                if changed:
+                    # keeps the name used in the db, plans refer to foods by name
+                    columns = NUTRIENT_COLUMNS + ["food_id", "fetched_at"]
+                else:
+                    columns = ["food_id", "fetched_at"]
+                for column in columns:
+                    df_food.loc[mask, column] = new_values[column]
+
+            _write_food_database(df_food)
+
+        log.info(f"Food database synced: {stats}")
+        return stats
+
+
+    def _load_checkpoint(self, checkpoint_path: Path) -> Dict[str, str]:
+        """
+        Returns the status ("resolved" or "failed") of each term already
+        processed by previous seeding runs.
+        """
+        statuses: Dict[str, str] = {}
+        if checkpoint_path.exists():
+            with checkpoint_path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue    # a line cut by a crash
+                    statuses[entry["term"]] = entry["status"]
+        return statuses
+
+
+    def _flush_seed_chunk(
+        self,
+        checkpoint_path: Path,
+        found: List[Tuple[str, FoodItem]],
+        failed: List[str],
+    ) -> None:
+        """
+        Appends the foods of a chunk to the database and only then records
+        its terms in the checkpoint, so a crash never marks as resolved a
+        term whose food wasn't saved.
+        """
+        if found:
+            with _food_database_write_lock():
+                df_food = pd.read_csv(self.db_path) if self.db_path.exists() else pd.DataFrame()
+                known = set(df_food["name"].str.lower()) if not df_food.empty else set()
+                new_foods = []
+                for _, food_item in found:
+                    if food_item.name.lower() not in known:
+                        known.add(food_item.name.lower())
+                        new_foods.append(asdict(food_item))
+                if new_foods:
+                    df_food = pd.concat([df_food, pd.DataFrame(new_foods)], ignore_index=True)
+                    _write_food_database(df_food)
+
+        with checkpoint_path.open("a", encoding="utf-8") as f:
+            for term, food_item in found:
+                f.write(json.dumps({"term": term, "status": "resolved", "name": food_item.name},
+                                   ensure_ascii=False) + "\n")
+            for term in failed:
+                f.write(json.dumps({"term": term, "status": "failed"}, ensure_ascii=False) + "\n")
+
+
+    def seed(
+        self,
+        search_terms: Iterable[str],
+        checkpoint_path: Path | None = None,
+        chunk_size: int = 50,
+        retry_failed: bool = False,
+    ) -> Dict[str, int]:
+        """
+        Seeds the database from a (possibly very long) list of search terms.
+
+        Terms are deduplicated after normalization (the first spelling is
+        the one searched), and the ones resolved by a previous run (recorded
+        in the checkpoint) are never fetched again; failed ones are only
+        retried with `retry_failed`. Results
+        are appended to the database every `chunk_size` terms, so a crash
+        loses at most one chunk. Returns how many terms were resolved,
+        failed and skipped.
+        """
+        checkpoint_path = Path(checkpoint_path or get_settings().food_seed_checkpoint_file)
+        statuses = self._load_checkpoint(checkpoint_path)
+
+        terms: Dict[str, str] = {}
+        for term in search_terms:
+            normalized = normalize_term(term)
+            if normalized and normalized not in terms:
+                terms[normalized] = term.strip()    # first spelling, searched as written
+
+        stats = {"resolved": 0, "failed": 0, "skipped": 0}
+        found: List[Tuple[str, FoodItem]] = []
+        failed: List[str] = []
+        for normalized, term in terms.items():
+            status = statuses.get(normalized)
+            if status == "resolved" or (status == "failed" and not retry_failed):
+                stats["skipped"] += 1
+                continue
+
+            log.info(f"Searching for: {term}")
+            food_item = self._search_food(term)
+            if food_item is not None:
+                found.append((normalized, food_item))
+                stats["resolved"] += 1
+            else:
+                log.warning(f"The food information for {normalized} wasn't found.")
+                failed.append(normalized)
+                stats["failed"] += 1
+
+            if len(found) + len(failed) >= chunk_size:
+                self._flush_seed_chunk(checkpoint_path, found, failed)
+                found, failed = [], []
+
+        self._flush_seed_chunk(checkpoint_path, found, failed)
+        log.info(f"Seeding finished: {stats}")
+        return stats
@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+log = logging.getLogger(__name__)
+
+MealName = Literal["Comida 1", "Comida 2", "Comida 3", "Comida 4",
+                   "Snack", "Post entreno", "Pre entreno"]
+
+
+class LLMMealItem(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    food: str = Field(min_length=1)
+    amount: float = Field(gt=0)    # in grams
+
+
+class LLMMeal(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    name: MealName
+    items: List[LLMMealItem]
+
+
+class LLMMealsPlan(BaseModel):
+    """
+    Meals plan exactly as the LLM must return it: just foods and grams.
+    Its JSON schema is sent to OpenAI to enforce the format of the answer.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    user: str
+    training_day: bool
+    meals: List[LLMMeal]
+
+
+def _strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drops the keywords OpenAI's strict structured outputs don't support
+    (the numeric and length bounds are still checked by the parser).
+    """
+    unsupported = {"exclusiveMinimum", "minLength"}
+    if isinstance(schema, dict):
+        return {key: _strict_schema(value) for key, value in schema.items() if key not in unsupported}
+    if isinstance(schema, list):
+        return [_strict_schema(value) for value in schema]
+    return schema
+
+
+PLAN_RESPONSE_FORMAT: Dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "meals_plan",
+        "strict": True,
+        "schema": _strict_schema(LLMMealsPlan.model_json_schema()),
+    },
+}
+
+
+def clean_json_from_llm(text: str) -> str:
+    if text.strip().startswith("```"):
+        # Extrae el contenido dentro del bloque
+        text = re.sub(r"```(?:json)?\n(.*?)(?:```|$)", r"\1", text.strip(), flags=re.DOTALL).strip()
+    return text
+
+
+def _close_json(prefix: str) -> str | None:
+    """
+    Appends the brackets needed to close a JSON prefix that ends right
+    after a complete value. Returns None if the prefix ends inside a string.
+    """
+    stack: List[str] = []
+    in_string = escaped = False
+    for char in prefix:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        return None
+    return prefix + "".join(reversed(stack))
+
+
+def _recover_json(text: str) -> Dict[str, Any] | None:
+    """
+    Recovers the largest well-formed part of a malformed or truncated JSON
+    answer: it cuts the text after the last complete object or list that
+    still makes it parseable, and closes the brackets left open.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    text = text[start:]
+
+    for end in range(len(text) - 1, -1, -1):
+        if text[end] not in "}]":
+            continue
+        candidate = _close_json(text[:end + 1])
+        if candidate is None:
+            continue
+        try:
+            data = json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def _validate_leniently(data: Dict[str, Any]) -> LLMMealsPlan:
+    """
+    Validates the plan keeping every meal and item that's valid on its own,
+    instead of rejecting the whole plan because of a single bad entry.
+    Meals and items that don't have the expected shape are skipped.
+    """
+    raw_meals = data.get("meals")
+    meals = []
+    for raw_meal in raw_meals if isinstance(raw_meals, list) else []:
+        if not isinstance(raw_meal, dict):
+            continue
+        raw_items = raw_meal.get("items")
+        items = []
+        for raw_item in raw_items if isinstance(raw_items, list) else []:
+            try:
+                items.append(LLMMealItem.model_validate(raw_item))
+            except ValidationError as e:
+                log.warning(f"Dropping invalid item {raw_item}: {e.errors()[0]['msg']}")
+        try:
+            meals.append(LLMMeal(name=raw_meal.get("name"), items=items))
+        except ValidationError as e:
+            log.warning(f"Dropping invalid meal {raw_meal.get('name')}: {e.errors()[0]['msg']}")
+
+    if not any(meal.items for meal in meals):
+        raise ValueError("The LLM answer doesn't contain any valid meal")
+
+    return LLMMealsPlan(
+        user=str(data.get("user", "")),
+        training_day=bool(data.get("training_day", True)),
+        meals=meals,
+    )
+
+
+def parse_plan_response(text: str) -> LLMMealsPlan:
+    """
+    Parses the LLM answer into a validated plan. Well-formed answers (the
+    norm with schema-constrained output) go through pydantic's fast JSON
+    validator; otherwise the answer is cleaned, the parseable part of it
+    is recovered and its valid meals and items are kept. Raises ValueError
+    only when nothing usable can be recovered, whatever the shape of the
+    answer:
+
+    >>> parse_plan_response('{"meals": 5}')
+    Traceback (most recent call last):
+    ...
+    ValueError: The LLM answer doesn't contain any valid meal
+    >>> parse_plan_response('{"meals": [{"name": "Snack", "items": 7}]}')
+    Traceback (most recent call last):
+    ...
+    ValueError: The LLM answer doesn't contain any valid meal
+    """
+    try:
+        return LLMMealsPlan.model_validate_json(text)
+    except ValidationError:
+        log.warning("The LLM answer doesn't match the plan schema, trying to recover it")
+
+    cleaned = clean_json_from_llm(text)
+    try:
+        data = json.loads(cleaned)
+    except json.JSONDecodeError:
+        data = _recover_json(cleaned)
+    if not isinstance(data, dict):
+        raise ValueError("The LLM answer doesn't contain a JSON object")
+
+    return _validate_leniently(data)
@@ -6,6 +6,7 @@ import pandas as pd
 
 from diet_generation.config.settings import get_settings
 from diet_generation.diet.meals_plan_llm import MealsPlanLLM
+from diet_generation.diet.nutrients import NutrientEngine, macros_error
 from diet_generation.diet.types import MealsPlan
 from diet_generation.user.types import DietType
 from diet_generation.user.user import User
@@ -23,6 +24,7 @@ class MealsPlanGenerator:
         self.user: User = user
         self.food_db: pd.DataFrame = _load_food_database()
         self.generator = MealsPlanLLM(self.user)
+        self._nutrients: NutrientEngine | None = None
 
         # TODO: uncomment this when we generate a vector space to filter foods
         # self.food_db_filtered = self._filter_db_by_constraints(
@@ -32,6 +34,17 @@ class MealsPlanGenerator:
         # )
 
 
+    @property
+    def nutrients(self) -> NutrientEngine:
+        """
+        Built on first use: generating a plan doesn't need it, so requests
+        that only generate don't pay for indexing the food database.
+        """
+        if self._nutrients is None:
+            self._nutrients = NutrientEngine()
+        return self._nutrients
+
+
     def select_meals_plan_from_pool(self) -> MealsPlan:
         """
         Selects a meals plan template taking the best fit from a pool with 
@@ -73,7 +86,10 @@ class MealsPlanGenerator:
         as a query in the FatSecret API, and add it to the database.
         """
         # use LLM to generate a meals plan
-        meals_plan: MealsPlan = self.generator.generate_with_openai()
+        if settings.llm_plan_candidates > 1:
+            meals_plan: MealsPlan = self.generator.generate_best_of_n(settings.llm_plan_candidates)
+        else:
+            meals_plan: MealsPlan = self.generator.generate_with_openai()
         log.info(f"The following Meals Plan was generated for the user: \n{meals_plan}")
         
         # if there's any food that it's not in the db, add it (FoodDatabaseGenerator)
@@ -84,6 +100,8 @@ class MealsPlanGenerator:
         # if it doesn't meet the requirements add it explicitly to the prompt and 
         # call again
 
+        return meals_plan
+
 
     def check_hard_constraints_meals_plan(self, meals_plan: MealsPlan) -> bool:
         """
@@ -102,3 +120,7 @@ class MealsPlanGenerator:
         returns True if the meals plan complies with the macros with
         an error of less of the threshold, else returns False.
         """
+        per_day = self.nutrients.totals(meals_plan).per_day
+        errors = macros_error(per_day, meals_plan.macros)
+        log.info(f"Relative error of the plan against the macros: {errors}")
+        return all(error <= threshold for error in errors.values())
@@ -1,14 +1,18 @@
 from __future__ import annotations
-import json
-import re
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
 
 import pandas as pd
 from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
 from langchain_core.prompts import ChatPromptTemplate
 
 from diet_generation.config.settings import Settings, get_settings
 from diet_generation.diet.food_database import FoodDatabaseGenerator
+from diet_generation.diet.llm_schema import (
+    PLAN_RESPONSE_FORMAT, LLMMealsPlan, parse_plan_response
+)
+from diet_generation.diet.nutrients import NutrientEngine, macros_error
 from diet_generation.diet.types import MealsPlan, Meal, MealItem, FoodItem
 from diet_generation.user.types import Macros
 from diet_generation.user.user import User
@@ -20,12 +24,33 @@ from diet_generation.utils.io import _load_food_database
 log = logging.getLogger(__name__)
 settings: Settings = get_settings()
 
+# score added for each food of a candidate plan that couldn't be resolved
+DROPPED_FOOD_PENALTY = 0.1
 
-def clean_json_from_llm(text: str) -> str:
-    if text.strip().startswith("```"):
-        # Extrae el contenido dentro del bloque
-        text = re.sub(r"```(?:json)?\n(.*?)```", r"\1", text, flags=re.DOTALL).strip()
-    return text
+
+_chat_model: BaseChatModel | None = None
+
+
+def get_chat_model() -> BaseChatModel:
+    """
+    Returns the chat model shared by every plan generation in the process,
+    so its HTTP client and connections are reused between requests.
+    """
+    global _chat_model
+    if _chat_model is None:
+        _chat_model = ChatOpenAI(model="gpt-4o", temperature=0.5, api_key=settings.openai_api_key)
+    return _chat_model
+
+
+def set_chat_model(model: BaseChatModel | None) -> BaseChatModel | None:
+    """
+    Replaces the shared chat model (e.g. by a recording or replaying
+    stand-in) and returns the previous one, so it can be restored.
+    Passing None goes back to the default OpenAI model.
+    """
+    global _chat_model
+    previous, _chat_model = _chat_model, model
+    return previous
 
 
 class MealsPlanLLM:
@@ -37,7 +62,7 @@ class MealsPlanLLM:
     def __init__(self, user: User) -> "MealsPlanLLM":
         self.food_db = _load_food_database()
         self.user = user
-        self.llm = ChatOpenAI(model="gpt-4o", temperature=0.5, api_key=settings.openai_api_key)
+        self.llm = get_chat_model()
 
 
     def _format_food_db(self) -> str:
@@ -92,7 +117,7 @@ class MealsPlanLLM:
             "training_day": {training_day},
             "meals": [
                 {{
-                "name": "Desayuno",
+                "name": "Comida 1",
                 "items": [
                     {{"food": "Avena", "amount": 50}},
                     {{"food": "Claras de huevo", "amount": 120}}
@@ -106,23 +131,34 @@ class MealsPlanLLM:
         return prompt
 
 
-    def _parse_llm_result(self, llm_result: str | list[str | dict]) -> MealsPlan:
+    def _parse_llm_result(
+        self,
+        llm_result: str | LLMMealsPlan,
+        fetch_missing: bool = True,
+    ) -> MealsPlan:
         """
-        Parses the LLM result (assumed to be a JSON-like dict) into MealsPlan.
+        Parses the LLM result (its raw text, or an already validated plan)
+        into MealsPlan. Foods that aren't in the database are fetched from
+        FatSecret, unless `fetch_missing` is False, in which case they're
+        skipped.
         """
         log.info(f"Response type of LLM: {type(llm_result)}")
         if isinstance(llm_result, str):
-            llm_result = json.loads(llm_result)
+            llm_result = parse_plan_response(llm_result)
 
         meals = []
-        for meal in llm_result["meals"]:
+        for meal in llm_result.meals:
             items = []
-            for item in meal["items"]:
-                name = item["food"]
-                amount = item["amount"]
+            for item in meal.items:
+                name = item.food
+                amount = item.amount
                 
                 food_row = self.food_db[self.food_db["name"].str.lower() == name.lower()]
 
+                if food_row.empty and not fetch_missing:
+                    log.warning(f"'{name}' isn't in the database, skipping")
+                    continue
+
                 if food_row.empty:
                     log.info(f"'{name}' not found in DB, trying to fetch from FatSecret")
                     success = self._try_add_food(name)
@@ -131,16 +167,19 @@ class MealsPlanLLM:
                         continue
                     self.food_db = _load_food_database()
                     food_row = self.food_db[self.food_db["name"].str.lower() == name.lower()]
+                    if food_row.empty:
+                        log.warning(f"'{name}' was stored under another name, skipping")
+                        continue
 
                 log.info(f"food_raw: {food_row}")
-                food = FoodItem(**food_row.iloc[0].to_dict())
+                food = FoodItem.from_row(food_row.iloc[0].to_dict())
                 items.append(MealItem(food=food, amount=amount))
 
-            meals.append(Meal(name=meal["name"], items=items))
+            meals.append(Meal(name=meal.name, items=items))
 
         return MealsPlan(
-            user=llm_result["user"],
-            training_day=llm_result["training_day"],
+            user=llm_result.user,
+            training_day=llm_result.training_day,
             macros=self.user.macros,
             meals=meals
         )
@@ -160,12 +199,12 @@ class MealsPlanLLM:
         """
         prompt_text = self._build_prompt()
         prompt = ChatPromptTemplate.from_template("{prompt}")
-        chain = prompt | self.llm
+        # the answer is constrained by OpenAI to the JSON schema of the plan
+        chain = prompt | self.llm.bind(response_format=PLAN_RESPONSE_FORMAT)
 
         result = chain.invoke({"prompt": prompt_text})
-        raw_text: str | list[str | dict] = result.content
+        raw_text: str = result.content
         log.info(f"The response from OpenAI was this one:")
-        raw_text = clean_json_from_llm(raw_text)
         log.info(raw_text)
 
         try:
@@ -173,3 +212,105 @@ class MealsPlanLLM:
         except Exception as e:
             log.error(f"Error parsing LLM result: {e}")
             raise
+
+
+    def _validate_candidate(self, raw_text: str) -> LLMMealsPlan | None:
+        """
+        Validates one of the candidate plans, or returns None if it's malformed.
+        Any error is caught: a bad candidate is discarded, it must not sink
+        the others.
+        """
+        try:
+            return parse_plan_response(raw_text)
+        except Exception as e:
+            log.warning(f"Discarding malformed candidate plan: {type(e).__name__}: {e}")
+            return None
+
+
+    def _add_missing_foods(self, llm_results: List[LLMMealsPlan]) -> None:
+        """
+        Adds to the database, once each, the foods of the candidates that
+        aren't in it yet. Candidates of the same prompt usually share them.
+        """
+        known = set(self.food_db["name"].str.lower())
+        missing: Dict[str, str] = {}
+        for llm_result in llm_results:
+            for meal in llm_result.meals:
+                for item in meal.items:
+                    key = item.food.lower()
+                    if key not in known and key not in missing:
+                        missing[key] = item.food
+
+        added = False
+        for name in missing.values():
+            log.info(f"'{name}' not found in DB, trying to fetch from FatSecret")
+            added = self._try_add_food(name) or added
+        if added:
+            self.food_db = _load_food_database()
+
+
+    def _parse_candidate(self, llm_result: LLMMealsPlan) -> Tuple[MealsPlan, int]:
+        """
+        Parses one of the validated candidate plans, returning it with the
+        number of foods that had to be dropped because they couldn't be
+        resolved. Missing foods must have been added beforehand.
+        """
+        meals_plan = self._parse_llm_result(llm_result, fetch_missing=False)
+
+        requested = sum(len(meal.items) for meal in llm_result.meals)
+        resolved = sum(len(meal.items) for meal in meals_plan.meals)
+        return meals_plan, requested - resolved
+
+
+    def _score_candidates(self, candidates: List[Tuple[MealsPlan, int]]) -> List[float]:
+        """
+        Scores the candidates against the user's macros (lower is better):
+        the mean relative error of the macros, plus penalties for dropped
+        foods and for a number of meals outside of the 3 to 7 requested.
+        The diet type and medical restrictions aren't scored, the food
+        database has no data to check them against; the prompt asks for them.
+        """
+        engine = NutrientEngine()
+        totals = engine.totals_batch([meals_plan for meals_plan, _ in candidates])
+
+        scores = []
+        for (meals_plan, dropped), plan_totals in zip(candidates, totals):
+            errors = macros_error(plan_totals.per_day, self.user.macros)
+            score = sum(errors.values()) / len(errors) + DROPPED_FOOD_PENALTY * dropped
+            if not 3 <= len(meals_plan.meals) <= 7:
+                score += 1.0
+            scores.append(score)
+        return scores
+
+
+    def generate_best_of_n(self, n: int = 3) -> MealsPlan:
+        """
+        Asks the LLM for `n` candidate plans in a single request (using the
+        API's `n` parameter, with the plan's JSON schema enforced), parses
+        them in parallel and returns the one that best fits the user's
+        macros. It replaces several sequential calls when a single plan
+        would miss the macros.
+        """
+        prompt_text = self._build_prompt()
+        prompt = ChatPromptTemplate.from_template("{prompt}")
+        messages = prompt.format_messages(prompt=prompt_text)
+
+        result = self.llm.generate([messages], n=n, response_format=PLAN_RESPONSE_FORMAT)
+        raw_texts = [generation.message.content for generation in result.generations[0]]
+        log.info(f"OpenAI returned {len(raw_texts)} candidate plans")
+
+        with ThreadPoolExecutor(max_workers=len(raw_texts) or 1) as executor:
+            validated = [llm_result for llm_result in executor.map(self._validate_candidate, raw_texts)
+                         if llm_result is not None]
+        if not validated:
+            raise ValueError(f"None of the {len(raw_texts)} candidate plans could be parsed")
+
+        # resolved before the parallel parse, so each food is fetched and stored once
+        self._add_missing_foods(validated)
+        with ThreadPoolExecutor(max_workers=len(validated)) as executor:
+            candidates = list(executor.map(self._parse_candidate, validated))
+
+        scores = self._score_candidates(candidates)
+        best = min(range(len(candidates)), key=scores.__getitem__)
+        log.info(f"Candidate scores: {[round(score, 3) for score in scores]}, picked #{best}")
+        return candidates[best][0]
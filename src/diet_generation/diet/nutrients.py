@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from diet_generation.config.settings import get_settings
+from diet_generation.diet.shared_food_table import attach_food_table, per_gram_matrix
+from diet_generation.diet.types import NUTRIENT_FIELDS, FoodItem, MealsPlan
+from diet_generation.user.types import Macros
+from diet_generation.utils.io import _load_food_database
+
+# Macros attribute -> nutrient column with the same meaning
+MACROS_TO_NUTRIENTS: Dict[str, str] = {
+    "calories": "kcal",
+    "protein": "protein",
+    "carbohydrates": "carbs",
+    "fat": "fat",
+    "fiber": "fiber",
+}
+
+
+@dataclass(frozen=True)
+class PlanNutrients:
+    per_meal: pd.DataFrame  # one row per meal, one column per nutrient
+    per_day: pd.Series      # totals of the whole plan
+    coverage: pd.Series     # fraction of the plan's grams with data for each nutrient
+
+
+def macros_error(per_day: pd.Series, macros: Macros) -> Dict[str, float]:
+    """
+    Relative error of the plan's totals against each of the user's macros.
+    A macro without data in the plan counts as a complete miss (1.0).
+    """
+    errors = {}
+    for macro, nutrient in MACROS_TO_NUTRIENTS.items():
+        target, actual = getattr(macros, macro), per_day.get(nutrient)
+        if actual is None or pd.isna(actual):
+            errors[macro] = 1.0
+        else:
+            errors[macro] = float(abs(actual - target) / target) if target else float(actual != 0)
+    return errors
+
+
+class NutrientEngine:
+    """
+    Computes the nutritional totals of meals plans with matrix products.
+
+    The food database is turned once into a (foods x nutrients) matrix of
+    amounts per gram. A plan (or a batch of plans) becomes a (meals x foods)
+    matrix of grams, so every meal total and every daily total comes from
+    a single product, for all the nutrients of FoodItem at once.
+
+    Missing values don't count as zero: a total only includes the foods
+    that have data for that nutrient, the coverage tells which fraction of
+    the grams that is, and a total without any data at all is NaN.
+
+    Without an explicit food database, the per-gram matrix published in
+    the shared food table is used directly, without copying it.
+    """
+
+    def __init__(self, food_db: pd.DataFrame | None = None) -> "NutrientEngine":
+        if food_db is None and get_settings().food_db_shared_snapshot:
+            snapshot = attach_food_table()
+            food_db, self._per_gram = snapshot.frame, snapshot.per_gram
+        else:
+            food_db = _load_food_database() if food_db is None else food_db
+            self._per_gram = per_gram_matrix(food_db)
+
+        # every row keeps its line in the matrix (so it lines up with the
+        # table), names are matched case-insensitively and the first row
+        # of a repeated name wins, e.g. "Egg" over a later "egg"
+        self._index: Dict[str, int] = {}
+        for i, name in enumerate(food_db["name"]):
+            self._index.setdefault(name.lower(), i)
+
+
+    def _ensure_foods(self, plans: Sequence[MealsPlan]) -> None:
+        """
+        Adds to the matrix the foods of the plans that aren't in the
+        database, using the information carried by their FoodItem.
+        """
+        missing: Dict[str, FoodItem] = {}
+        for plan in plans:
+            for meal in plan.meals:
+                for item in meal.items:
+                    key = item.food.name.lower()
+                    if key not in self._index and key not in missing:
+                        missing[key] = item.food
+
+        if not missing:
+            return
+
+        new_rows = per_gram_matrix(pd.DataFrame(asdict(food) for food in missing.values()))
+        for i, key in enumerate(missing, start=self._per_gram.shape[0]):
+            self._index[key] = i
+        self._per_gram = np.vstack([self._per_gram, new_rows])
+
+
+    def totals_batch(self, plans: Sequence[MealsPlan]) -> List[PlanNutrients]:
+        """
+        Computes the per-meal and per-day totals of many plans at once.
+        """
+        self._ensure_foods(plans)
+
+        meal_names: List[str] = []
+        plan_of_meal: List[int] = []
+        rows: List[int] = []
+        cols: List[int] = []
+        grams: List[float] = []
+        for p, plan in enumerate(plans):
+            for meal in plan.meals:
+                for item in meal.items:
+                    rows.append(len(meal_names))
+                    cols.append(self._index[item.food.name.lower()])
+                    grams.append(float(item.amount))
+                meal_names.append(meal.name)
+                plan_of_meal.append(p)
+
+        amounts = np.zeros((len(meal_names), self._per_gram.shape[0]))
+        np.add.at(amounts, (rows, cols), grams)
+
+        known = ~np.isnan(self._per_gram)
+        meal_totals = amounts @ np.where(known, self._per_gram, 0.0)
+        meal_known_grams = amounts @ known
+        meal_totals[meal_known_grams == 0] = np.nan
+
+        # (plans x meals) membership matrix, to add up the meals of each plan
+        membership = np.zeros((len(plans), len(meal_names)))
+        membership[plan_of_meal, np.arange(len(meal_names))] = 1.0
+        day_totals = membership @ np.nan_to_num(meal_totals)
+        day_known_grams = membership @ meal_known_grams
+        day_grams = membership @ amounts.sum(axis=1)
+        day_totals[day_known_grams == 0] = np.nan
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            coverage = np.where(day_grams[:, None] > 0, day_known_grams / day_grams[:, None], np.nan)
+
+        results = []
+        plan_of_meal_arr = np.asarray(plan_of_meal, dtype=int)
+        for p in range(len(plans)):
+            meal_rows = np.flatnonzero(plan_of_meal_arr == p)
+            results.append(PlanNutrients(
+                per_meal=pd.DataFrame(
+                    meal_totals[meal_rows],
+                    index=[meal_names[i] for i in meal_rows],
+                    columns=NUTRIENT_FIELDS,
+                ),
+                per_day=pd.Series(day_totals[p], index=NUTRIENT_FIELDS),
+                coverage=pd.Series(coverage[p], index=NUTRIENT_FIELDS),
+            ))
+        return results
+
+
+    def totals(self, plan: MealsPlan) -> PlanNutrients:
+        """
+        Computes the per-meal and per-day totals of a plan.
+        """
+        return self.totals_batch([plan])[0]
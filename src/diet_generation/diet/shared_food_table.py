@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from diet_generation.config.settings import get_settings
+from diet_generation.diet.types import NUTRIENT_FIELDS
+
+log = logging.getLogger(__name__)
+
+# number of published versions kept on disk besides the current one
+_KEEP_VERSIONS = 2
+# times the current version is re-read when the one being attached is removed
+_ATTACH_ATTEMPTS = 3
+
+_snapshot_lock = threading.Lock()
+_snapshot: Optional["FoodTableSnapshot"] = None
+
+
+@dataclass(frozen=True)
+class FoodTableSnapshot:
+    version: str
+    frame: pd.DataFrame     # numeric columns are read-only views of the memory-mapped file,
+                            # text columns are per-process copies
+    per_gram: np.ndarray    # (foods x NUTRIENT_FIELDS), memory-mapped too
+
+
+def per_gram_matrix(foods: pd.DataFrame) -> np.ndarray:
+    """
+    Turns a food table into its (foods x nutrients) matrix of amounts per
+    gram. Missing values stay NaN.
+    """
+    values = foods.reindex(columns=NUTRIENT_FIELDS).to_numpy(dtype=float, na_value=np.nan)
+    grams = foods["grams"].to_numpy(dtype=float, na_value=np.nan, copy=True)
+    grams[~(grams > 0)] = np.nan    # a serving without weight can't be scaled
+    return values / grams[:, None]
+
+
+def _database_version(csv_path: Path) -> str:
+    """
+    Version of the food database, derived from the csv file, so every
+    write to it (a new food, a sync, a seeding chunk) is a new version.
+    Writes replace the file, so the inode tells apart two writes of the
+    same size within one tick of the filesystem's clock.
+    """
+    stat = csv_path.stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}-{stat.st_ino:x}"
+
+
+def _snapshot_paths(shared_dir: Path, version: str) -> tuple[Path, Path, Path, Path]:
+    # the metadata goes last, it's the file that makes a version visible
+    return (
+        shared_dir / f"food_{version}.npy",
+        shared_dir / f"food_text_{version}.npy",
+        shared_dir / f"food_per_gram_{version}.npy",
+        shared_dir / f"food_{version}.json",
+    )
+
+
+def _save_npy(path: Path, array: np.ndarray) -> None:
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def _remove_old_versions(shared_dir: Path, version: str) -> None:
+    metas = sorted(shared_dir.glob("food_*.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for meta in metas[_KEEP_VERSIONS + 1:]:
+        old_version = meta.stem.removeprefix("food_")
+        if old_version == version:
+            continue
+        for path in _snapshot_paths(shared_dir, old_version):
+            # processes that still map these files keep them alive until they're done
+            path.unlink(missing_ok=True)
+
+
+def publish_food_table(df: pd.DataFrame, version: str) -> None:
+    """
+    Publishes the food table as memory-mappable .npy files: the numeric
+    columns, the text columns (fixed-width unicode, empty for missing
+    values) and the per-gram nutrient matrix. A small JSON file with the
+    column layout is written last, so a version is only visible once it's
+    complete.
+    """
+    shared_dir = get_settings().food_db_shared_dir
+    shared_dir.mkdir(parents=True, exist_ok=True)
+    numeric_path, text_path, per_gram_path, meta_path = _snapshot_paths(shared_dir, version)
+
+    numeric_columns = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    text_columns = [c for c in df.columns if c not in numeric_columns]
+    text = df[text_columns].astype(object).fillna("").astype(str).to_numpy()
+    width = max((len(value) for value in text.flat), default=0) or 1
+
+    _save_npy(numeric_path, df[numeric_columns].to_numpy(dtype=float, na_value=np.nan))
+    _save_npy(text_path, text.astype(f"U{width}"))
+    _save_npy(per_gram_path, per_gram_matrix(df))
+
+    meta = {
+        "version": version,
+        "columns": list(df.columns),
+        "numeric_columns": numeric_columns,
+        "text_columns": text_columns,
+    }
+    tmp_path = meta_path.with_name(f"{meta_path.stem}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, meta_path)
+
+    _remove_old_versions(shared_dir, version)
+    log.info(f"Published version {version} of the food table ({len(df)} foods)")
+
+
+def _attach(version: str) -> FoodTableSnapshot:
+    shared_dir = get_settings().food_db_shared_dir
+    numeric_path, text_path, per_gram_path, meta_path = _snapshot_paths(shared_dir, version)
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+
+    numeric = np.load(numeric_path, mmap_mode="r")
+    text = np.load(text_path, mmap_mode="r")
+    per_gram = np.load(per_gram_path, mmap_mode="r")
+
+    # a single float block over the mapped file: pandas doesn't copy it
+    frame = pd.DataFrame(numeric, columns=meta["numeric_columns"], copy=False)
+    for j, column in enumerate(meta["text_columns"]):
+        # pandas keeps text as Python objects, so these are per process
+        values = pd.Series(text[:, j], dtype=object)
+        frame.insert(meta["columns"].index(column), column, values.mask(values == ""))
+
+    return FoodTableSnapshot(version=version, frame=frame, per_gram=per_gram)
+
+
+def attach_food_table() -> FoodTableSnapshot:
+    """
+    Returns the current version of the food table, attached read-only from
+    the shared memory-mapped files. Every process maps the same pages for
+    the numeric columns and the per-gram matrix, so the memory they use
+    doesn't grow with the number of workers; only the text columns are
+    turned into Python strings in each process.
+
+    When the csv changed since the last call (e.g. a food was inserted),
+    the new version is attached; the first process that needs a version
+    that wasn't published yet parses the csv and publishes it.
+    """
+    global _snapshot
+
+    csv_path = get_settings().food_database_file
+    if not csv_path.exists():
+        raise ValueError("The food database file wans't found. " \
+            "Confirm that the file was generated first by calling " \
+            "the endpoint `generate-food-database`.")
+
+    with _snapshot_lock:
+        for attempt in range(_ATTACH_ATTEMPTS):
+            version = _database_version(csv_path)
+            if _snapshot is not None and _snapshot.version == version:
+                return _snapshot
+
+            meta_path = _snapshot_paths(get_settings().food_db_shared_dir, version)[-1]
+            try:
+                if not meta_path.exists():
+                    publish_food_table(pd.read_csv(csv_path), version)
+                _snapshot = _attach(version)
+                return _snapshot
+            except FileNotFoundError:
+                # another process published newer versions and removed this
+                # one meanwhile, so the csv changed too: attach its version
+                if attempt == _ATTACH_ATTEMPTS - 1:
+                    raise
+                log.info(f"Version {version} of the food table was removed while attaching it, retrying")
@@ -1,5 +1,6 @@
-from dataclasses import dataclass
-from typing import List, Literal, Optional
+import math
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Literal, Optional
 
 from diet_generation.user.types import Macros
 
@@ -32,6 +33,27 @@ class FoodItem:
     vitamin_d: Optional[float] = None    # µg
     added_sugars: Optional[float] = None
 
+    # FatSecret metadata used to refresh the entry incrementally
+    food_id: Optional[int] = None
+    fetched_at: Optional[str] = None     # ISO 8601, UTC
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "FoodItem":
+        """
+        Builds the food item from a row of the food database. The ids are
+        turned back into ints: pandas reads them as floats when a column
+        has missing values, and the shared food table stores every numeric
+        column as float.
+        """
+        data = dict(row)
+        for field in ("serving_id", "food_id"):
+            value = data.get(field)
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                data[field] = None
+            else:
+                data[field] = int(value)
+        return cls(**data)
+
     def macros_per_gram(self) -> dict:
         return {
             "kcal": self.kcal / self.grams if self.grams else 0,
@@ -40,6 +62,13 @@ class FoodItem:
             "fat": self.fat / self.grams if self.grams else 0,
         }
 
+# every numeric field of FoodItem that's a nutrient amount per serving
+NUTRIENT_FIELDS: List[str] = [
+    f.name for f in fields(FoodItem)
+    if f.name not in ("name", "serving_id", "serving_description", "grams", "food_id", "fetched_at")
+]
+
+
 @dataclass()
 class MealItem:
     food: FoodItem
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import logging
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+
+from diet_generation.config.settings import get_settings
+from diet_generation.diet.fatsecret_client import get_fatsecret_client, set_fatsecret_client
+from diet_generation.diet.meals_plan_llm import get_chat_model, set_chat_model
+from diet_generation.loadtest.replay import (
+    Cassette, RecordingChatModel, RecordingFatSecretClient, ReplayChatModel, ReplayFatSecretClient
+)
+from diet_generation.pipelines.diet_pipeline import DietPipeline
+from diet_generation.service.metrics import LatencyTracker
+from diet_generation.user.types import ActivityLevel, DietType, Goal, Implementation, Sex, UserData
+
+log = logging.getLogger(__name__)
+
+
+def synthetic_user(rng: random.Random, index: int) -> UserData:
+    """
+    Builds a plausible random user, so the load isn't a single repeated request.
+    """
+    sex = rng.choice(list(Sex))
+    return UserData(
+        name=f"load{index}",
+        lastname="test",
+        age=rng.randint(18, 65),
+        weight=round(rng.uniform(50, 110) if sex == Sex.male else rng.uniform(45, 90), 1),
+        height=round(rng.uniform(165, 195) if sex == Sex.male else rng.uniform(150, 180), 1),
+        sex=sex,
+        activity_level=rng.choice(list(ActivityLevel)),
+        implementation=rng.choice(list(Implementation)),
+        goal=rng.choice(list(Goal)),
+        training_days=rng.randint(2, 7),
+        diet_type=rng.choice(list(DietType)),
+    )
+
+
+@contextmanager
+def _scratch_food_database() -> Iterator[None]:
+    """
+    Points the food database (and its shared snapshots) to a temporary
+    copy while the load test runs: plans may add the foods they miss, and
+    those must not end up in the real database.
+    """
+    settings = get_settings()
+    food_database_file, food_db_shared_dir = settings.food_database_file, settings.food_db_shared_dir
+
+    with tempfile.TemporaryDirectory(prefix="diet_loadtest_") as scratch_dir:
+        scratch_dir = Path(scratch_dir)
+        if food_database_file.exists():
+            shutil.copy(food_database_file, scratch_dir / food_database_file.name)
+        settings.food_database_file = scratch_dir / food_database_file.name
+        settings.food_db_shared_dir = scratch_dir / "shared"
+        try:
+            yield
+        finally:
+            settings.food_database_file = food_database_file
+            settings.food_db_shared_dir = food_db_shared_dir
+
+
+def _run_pipeline(user_data: UserData, latencies: LatencyTracker) -> None:
+    started = time.perf_counter()
+    pipeline = DietPipeline(user_data)
+    setup_done = time.perf_counter()
+    pipeline.generate()
+    finished = time.perf_counter()
+
+    latencies.record("setup", setup_done - started)
+    latencies.record("generate", finished - setup_done)
+    latencies.record("total", finished - started)
+
+
+def record(cassette_path: Path, samples: int = 3, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the full pipeline for `samples` synthetic users against the real
+    APIs, storing every LLM and FatSecret interaction in the cassette.
+    The foods added meanwhile go to a scratch copy of the database.
+    Returns the latency summary of each stage.
+    """
+    cassette = Cassette(cassette_path)
+    latencies = LatencyTracker(window=100_000)
+    real_llm, real_fatsecret = get_chat_model(), get_fatsecret_client()
+    set_chat_model(RecordingChatModel(inner=real_llm, cassette=cassette, latencies=latencies))
+    set_fatsecret_client(RecordingFatSecretClient(real_fatsecret, cassette, latencies))
+
+    rng = random.Random(seed)
+    try:
+        with _scratch_food_database():
+            for i in range(samples):
+                _run_pipeline(synthetic_user(rng, i), latencies)
+    finally:
+        set_chat_model(real_llm)
+        set_fatsecret_client(real_fatsecret)
+
+    return latencies.summary()
+
+
+def run_load(
+    cassette_path: Path,
+    users: int = 10,
+    requests: int = 100,
+    latency_scale: float = 1.0,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Replays the cassette with `users` concurrent synthetic users running
+    `requests` full pipelines in total, without touching the real APIs
+    nor the real food database. Returns the throughput and the p50/p95/p99
+    latency of each stage (setup, generate, total and the replayed llm and
+    fatsecret calls).
+    """
+    cassette = Cassette(cassette_path)
+    latencies = LatencyTracker(window=max(requests * 10, 1000))
+    previous_llm = set_chat_model(ReplayChatModel(cassette=cassette, latency_scale=latency_scale,
+                                                  latencies=latencies))
+    previous_fatsecret = set_fatsecret_client(ReplayFatSecretClient(cassette, latency_scale, latencies))
+
+    rng = random.Random(seed)
+    user_data = [synthetic_user(rng, i) for i in range(requests)]
+    errors = 0
+
+    started = time.perf_counter()
+    try:
+        with _scratch_food_database(), ThreadPoolExecutor(max_workers=users) as executor:
+            futures = [executor.submit(_run_pipeline, data, latencies) for data in user_data]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors += 1
+                    log.warning(f"Pipeline failed during the load test: {e}")
+    finally:
+        set_chat_model(previous_llm)
+        set_fatsecret_client(previous_fatsecret)
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round((requests - errors) / elapsed, 2) if elapsed else 0.0,
+        "stages": latencies.summary(),
+    }
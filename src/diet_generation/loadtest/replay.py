@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+
+from diet_generation.diet.fatsecret_client import FatSecretClient
+from diet_generation.service.metrics import LatencyTracker
+
+log = logging.getLogger(__name__)
+
+
+def _request_key(kind: str, request: Any) -> str:
+    payload = json.dumps([kind, request], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Interactions with the external APIs (LLM and FatSecret) stored in a
+    JSON lines file: the request, the response and how long it took.
+    """
+
+    def __init__(self, path: Path) -> "Cassette":
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, dict] = {}
+        self._by_kind: Dict[str, List[dict]] = defaultdict(list)
+        self._round_robin: Dict[str, itertools.count] = defaultdict(itertools.count)
+
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+            log.info(f"Loaded {len(self._by_key)} recorded interactions from {self.path}")
+
+
+    def _index(self, entry: dict) -> None:
+        self._by_key.setdefault(entry["key"], entry)
+        self._by_kind[entry["kind"]].append(entry)
+
+
+    def record(self, kind: str, request: Any, response: Any, latency: float) -> None:
+        entry = {
+            "kind": kind,
+            "key": _request_key(kind, request),
+            "request": request,
+            "response": response,
+            "latency": latency,
+        }
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            self._index(entry)
+
+
+    def get(self, kind: str, request: Any) -> dict | None:
+        """
+        Returns the interaction recorded for exactly this request, if any.
+        """
+        return self._by_key.get(_request_key(kind, request))
+
+
+    def lookup(self, kind: str, request: Any) -> dict | None:
+        """
+        Returns the interaction recorded for exactly this request or, for
+        requests never seen (e.g. the prompt of a synthetic user), the
+        recorded interactions of the same kind in round-robin.
+        """
+        entry = self.get(kind, request)
+        if entry is not None:
+            return entry
+
+        entries = self._by_kind.get(kind)
+        if not entries:
+            return None
+        return entries[next(self._round_robin[kind]) % len(entries)]
+
+
+def _messages_request(messages: List[BaseMessage], kwargs: Dict[str, Any]) -> dict:
+    return {
+        "messages": [[message.type, message.content] for message in messages],
+        "n": kwargs.get("n", 1),
+        "structured": "response_format" in kwargs,
+    }
+
+
+class RecordingChatModel(BaseChatModel):
+    """
+    Chat model that forwards every call to the real model and stores the
+    request, the answers and the latency in a cassette.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    inner: BaseChatModel
+    cassette: Cassette
+    latencies: Optional[LatencyTracker] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        latency = time.perf_counter() - started
+
+        texts = [generation.message.content for generation in result.generations]
+        self.cassette.record("llm", _messages_request(messages, kwargs), texts, latency)
+        if self.latencies is not None:
+            self.latencies.record("llm", latency)
+        return result
+
+
+class ReplayChatModel(BaseChatModel):
+    """
+    Stand-in for the chat model that answers with the recorded responses,
+    waiting their recorded latency multiplied by `latency_scale`.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    cassette: Cassette
+    latency_scale: float = 1.0
+    latencies: Optional[LatencyTracker] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        entry = self.cassette.lookup("llm", _messages_request(messages, kwargs))
+        if entry is None:
+            raise LookupError(f"No LLM interactions recorded in {self.cassette.path}")
+
+        time.sleep(entry["latency"] * self.latency_scale)
+        texts = entry["response"][:kwargs.get("n", 1)]
+        if self.latencies is not None:
+            self.latencies.record("llm", time.perf_counter() - started)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text)) for text in texts])
+
+
+class RecordingFatSecretClient(FatSecretClient):
+    """
+    FatSecret client that forwards every call to the real client and stores
+    the request, the response and the latency in a cassette.
+    """
+
+    def __init__(
+        self,
+        inner: FatSecretClient,
+        cassette: Cassette,
+        latencies: LatencyTracker | None = None,
+    ) -> "RecordingFatSecretClient":
+        self.inner = inner
+        self.cassette = cassette
+        self.latencies = latencies
+
+
+    def request(self, method: str, **params: Any) -> Dict[str, Any]:
+        started = time.perf_counter()
+        response = self.inner.request(method, **params)
+        latency = time.perf_counter() - started
+
+        self.cassette.record("fatsecret", {"method": method, **params}, response, latency)
+        if self.latencies is not None:
+            self.latencies.record("fatsecret", latency)
+        return response
+
+
+class ReplayFatSecretClient(FatSecretClient):
+    """
+    Stand-in for the FatSecret client that answers with the recorded
+    responses, waiting their recorded latency multiplied by `latency_scale`.
+    Unknown requests get an empty response, as if nothing had been found.
+    """
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        latency_scale: float = 1.0,
+        latencies: LatencyTracker | None = None,
+    ) -> "ReplayFatSecretClient":
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.latencies = latencies
+
+
+    def request(self, method: str, **params: Any) -> Dict[str, Any]:
+        started = time.perf_counter()
+        entry = self.cassette.get("fatsecret", {"method": method, **params})
+        response: Dict[str, Any] = {}
+        if entry is not None:
+            time.sleep(entry["latency"] * self.latency_scale)
+            response = entry["response"]
+
+        if self.latencies is not None:
+            self.latencies.record("fatsecret", time.perf_counter() - started)
+        return response
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from diet_generation.config.settings import get_settings
+from diet_generation.user.types import UserData
+
+
+settings = get_settings()
+log = logging.getLogger(__name__)
+
+
+# UserData field -> column of the Google Form's csv export
+FORM_COLUMNS: Dict[str, str] = {
+    "timestamp": "Marca temporal",
+    "email": "Dirección de correo electrónico",
+    "name": "Nombre",
+    "lastname": "Apellido",
+    "age": "Edad",
+    "weight": "Peso (kg)",
+    "height": "Estatura (cm)",
+    "sex": "Sexo",
+    "activity_level": "Nivel de actividad",
+    "implementation": "Lugar de entrenamiento",
+    "goal": "Objetivo",
+    "training_days": "Días de entrenamiento por semana",
+    "condition": "Condiciones médicas",
+    "diet_type": "Tipo de dieta",
+    "notes": "Comentarios",
+}
+
+# answers of the form (lowercase) -> value of the corresponding enum
+VALUE_ALIASES: Dict[str, str] = {
+    "masculino": "male", "hombre": "male",
+    "femenino": "female", "mujer": "female",
+    "sedentario": "sedentary", "bajo": "low", "medio": "medium", "alto": "high",
+    "gimnasio": "gym", "peso corporal": "bodyweight", "casa": "bodyweight",
+    "bajar de peso": "weight loss", "pérdida de peso": "weight loss",
+    "ganar masa muscular": "gain muscle", "recomposición corporal": "body recomposition",
+    "omnívora": "omnivore", "omnívoro": "omnivore",
+    "vegetariana": "vegetarian", "vegetariano": "vegetarian",
+    "vegana": "vegan", "vegano": "vegan",
+}
+
+ENUM_FIELDS = ("sex", "activity_level", "implementation", "goal", "diet_type")
+
+
+class FormIngestion:
+    """
+    Reads the csv export of the Google Form with the clients' information
+    and turns each answer into UserData.
+
+    A state file keeps the watermark of the previous run: how many rows
+    of the export were processed and the latest `Marca temporal` among
+    them, plus a fingerprint of each processed row keyed by its identity
+    (timestamp + email). Each run only maps and hashes the rows appended
+    after the watermark and the older ones whose timestamp moved past it
+    (Google Forms updates the timestamp of an edited answer in place).
+    """
+
+    def __init__(
+        self,
+        csv_path: Path,
+        *,
+        columns: Optional[Dict[str, str]] = None,
+        state_path: Optional[Path] = None,
+    ) -> "FormIngestion":
+        self.csv_path = Path(csv_path)
+        self.columns = {**FORM_COLUMNS, **(columns or {})}
+        self.state_path = Path(state_path or settings.form_ingestion_state_file)
+
+        state = self._load_state()
+        self.rows_processed: int = state.get("rows_processed", 0)
+        self.last_timestamp: Optional[pd.Timestamp] = (
+            pd.Timestamp(state["last_timestamp"]) if state.get("last_timestamp") else None
+        )
+        self.fingerprints: Dict[str, str] = state.get("fingerprints", {})
+
+
+    def _load_state(self) -> Dict[str, Any]:
+        if not self.state_path.exists():
+            return {}
+        return json.loads(self.state_path.read_text(encoding="utf-8"))
+
+
+    def save_state(self) -> None:
+        state = {
+            "rows_processed": self.rows_processed,
+            "last_timestamp": self.last_timestamp.isoformat() if self.last_timestamp is not None else None,
+            "fingerprints": self.fingerprints,
+        }
+        tmp_path = self.state_path.with_suffix(self.state_path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(state), encoding="utf-8")
+        tmp_path.replace(self.state_path)
+
+
+    def _respondent_key(self, row: Dict[str, str]) -> str:
+        """
+        Identifies who answered, for the logs.
+        """
+        email = row.get(self.columns["email"], "").strip().lower()
+        if email:
+            return email
+        name = row.get(self.columns["name"], "").strip().lower()
+        lastname = row.get(self.columns["lastname"], "").strip().lower()
+        return f"{name} {lastname}"
+
+
+    def _row_key(self, row: Dict[str, str]) -> str:
+        """
+        Identifies a row of the export, so a client answering more than
+        once gets one entry per answer.
+        """
+        timestamp = row.get(self.columns["timestamp"], "").strip()
+        return f"{timestamp}|{self._respondent_key(row)}"
+
+
+    @staticmethod
+    def _fingerprint(row: Dict[str, str]) -> str:
+        content = json.dumps(row, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+    def _to_user_data(self, row: Dict[str, str]) -> UserData:
+        data = {
+            field: row.get(column, "").strip()
+            for field, column in self.columns.items()
+            if field not in ("timestamp", "email")
+        }
+        for field in ENUM_FIELDS:
+            value = data.get(field, "").lower()
+            data[field] = VALUE_ALIASES.get(value, value) or None
+        data["age"] = int(float(data["age"]))
+        data["weight"] = float(data["weight"].replace(",", "."))
+        data["height"] = float(data["height"].replace(",", "."))
+        data["training_days"] = int(float(data["training_days"]))
+        data["condition"] = data.get("condition") or None
+        data["notes"] = data.get("notes") or None
+        return UserData.from_dict(data)
+
+
+    def _timestamps(self, df: pd.DataFrame) -> pd.Series:
+        column = self.columns["timestamp"]
+        if column not in df.columns:
+            return pd.Series(pd.NaT, index=df.index)
+        # the export uses the locale of the sheet, e.g. "30/04/2025 10:15:32"
+        return pd.to_datetime(df[column], dayfirst=True, format="mixed", errors="coerce")
+
+
+    def pending(self) -> Iterator[Tuple[int, pd.Timestamp, str, str, Optional[UserData]]]:
+        """
+        Yields (row position, timestamp, row key, fingerprint, user data)
+        for each answer that is new or changed since the last run. The
+        user data is None when the answer couldn't be mapped to UserData.
+        """
+        df = pd.read_csv(self.csv_path, dtype=str, keep_default_na=False)
+        missing = [column for field, column in self.columns.items()
+                   if column not in df.columns and field not in ("timestamp", "email", "condition", "notes")]
+        if missing:
+            raise ValueError(f"The form export is missing the columns: {missing}")
+
+        timestamps = self._timestamps(df)
+        candidates = pd.Series(range(len(df)), index=df.index) >= self.rows_processed
+        if self.last_timestamp is not None:
+            candidates |= timestamps > self.last_timestamp
+
+        for position in candidates.to_numpy().nonzero()[0]:
+            row = df.iloc[position].to_dict()
+            key = self._row_key(row)
+            fingerprint = self._fingerprint(row)
+            if self.fingerprints.get(key) == fingerprint:
+                continue
+
+            try:
+                user_data = self._to_user_data(row)
+            except (KeyError, ValueError, TypeError) as e:
+                log.warning(f"Skipping the answer of '{self._respondent_key(row)}', it couldn't be parsed: {e}")
+                user_data = None
+            yield int(position), timestamps.iloc[position], key, fingerprint, user_data
+
+
+    def run(self, handle: Callable[[UserData], None]) -> Dict[str, int]:
+        """
+        Passes each new or changed answer to `handle` (e.g. submitting it
+        to the plan generation queue) and advances the watermark after
+        each one. If `handle` raises, the run stops there and that answer
+        is processed again next time. Returns how many answers were
+        processed and how many were invalid.
+        """
+        stats = {"processed": 0, "invalid": 0}
+        last_timestamp = self.last_timestamp
+        try:
+            for position, timestamp, key, fingerprint, user_data in self.pending():
+                if user_data is not None:
+                    handle(user_data)
+                    stats["processed"] += 1
+                else:
+                    stats["invalid"] += 1
+                # invalid answers are marked too, they're retried once they're edited
+                self.fingerprints[key] = fingerprint
+                self.rows_processed = max(self.rows_processed, position + 1)
+                if pd.notna(timestamp) and (last_timestamp is None or timestamp > last_timestamp):
+                    last_timestamp = timestamp
+            # only moved once every answer went through, so an edit that
+            # failed isn't hidden behind a later one that was processed
+            self.last_timestamp = last_timestamp
+        finally:
+            self.save_state()
+
+        log.info(f"Form ingestion finished: {stats}")
+        return stats
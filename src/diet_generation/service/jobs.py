@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Literal, Optional
+
+from diet_generation.config.settings import Settings, get_settings
+from diet_generation.user.types import UserData
+from diet_generation.utils.io import _to_jsonable
+
+log = logging.getLogger(__name__)
+settings: Settings = get_settings()
+
+JobStatus = Literal["pending", "running", "done", "failed"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    locked_by TEXT,
+    locked_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_claim_idx ON jobs (status, available_at);
+"""
+
+
+class QueueFullError(RuntimeError):
+    """
+    Raised when a job is submitted while the queue already holds the
+    maximum number of pending jobs.
+    """
+
+
+@dataclass(frozen=True)
+class Job:
+    id: str
+    status: JobStatus
+    payload: Dict[str, Any]
+    attempts: int
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class JobQueue:
+    """
+    Durable queue of plan generation requests stored in a SQLite file.
+    Jobs survive process crashes: a job that was left running by a dead
+    worker is handed out again once its lease expires.
+    """
+
+    def __init__(self, db_path: Path | None = None) -> "JobQueue":
+        self.db_path = Path(db_path or settings.jobs_database_file)
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+
+    def _row_to_job(self, row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            status=row["status"],
+            payload=json.loads(row["payload"]),
+            attempts=row["attempts"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+        )
+
+
+    def submit(self, payload: Dict[str, Any]) -> str:
+        """
+        Validates the user's data and enqueues a plan generation for it.
+        Returns the id of the new job. Raises QueueFullError when there
+        are already `job_max_pending` jobs waiting.
+        """
+        UserData.from_dict(payload)
+        now = time.time()
+        job_id = uuid.uuid4().hex
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            (pending,) = self.conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('pending', 'running')"
+            ).fetchone()
+            if pending >= settings.job_max_pending:
+                raise QueueFullError(f"The queue already has {pending} pending jobs, " \
+                                     f"try again later.")
+            self.conn.execute(
+                "INSERT INTO jobs (id, status, payload, available_at, created_at, updated_at) "
+                "VALUES (?, 'pending', ?, ?, ?, ?)",
+                (job_id, json.dumps(payload), now, now, now),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return job_id
+
+
+    def get(self, job_id: str) -> Job | None:
+        row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+
+    def claim(self, worker_id: str) -> Job | None:
+        """
+        Atomically takes the oldest job that is ready to run, marking it
+        as running by the given worker. Jobs whose lease expired (their
+        worker crashed) are claimable again.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT * FROM jobs "
+                "WHERE (status = 'pending' AND available_at <= ?) "
+                "   OR (status = 'running' AND locked_at <= ?) "
+                "ORDER BY available_at LIMIT 1",
+                (now, now - settings.job_lease_seconds),
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+
+            if row["status"] == "running":
+                log.warning(f"Recovering job {row['id']} abandoned by worker {row['locked_by']}")
+                if row["attempts"] >= settings.job_max_attempts:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, locked_by = NULL, "
+                        "updated_at = ? WHERE id = ?",
+                        ("Worker crashed on the last attempt", now, row["id"]),
+                    )
+                    self.conn.execute("COMMIT")
+                    return None
+
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                "locked_by = ?, locked_at = ?, updated_at = ? WHERE id = ?",
+                (worker_id, now, now, row["id"]),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        return self.get(row["id"])
+
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """
+        Stores the result of a job run by the given worker. Returns False,
+        without changing the job, when the worker no longer holds it (its
+        lease expired and the job was claimed again).
+        """
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, locked_by = NULL, "
+            "updated_at = ? WHERE id = ? AND status = 'running' AND locked_by = ?",
+            (json.dumps(_to_jsonable(result)), time.time(), job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """
+        Records a failed attempt of the given worker. The job is retried
+        with exponential backoff until it reaches `job_max_attempts`, then
+        it's marked as failed for good. Returns False, without changing the
+        job, when the worker no longer holds it.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+
+        now = time.time()
+        if job.attempts >= settings.job_max_attempts:
+            status, available_at = "failed", now
+        else:
+            status = "pending"
+            available_at = now + settings.job_retry_backoff_seconds * 2 ** (job.attempts - 1)
+
+        cursor = self.conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, available_at = ?, locked_by = NULL, "
+            "updated_at = ? WHERE id = ? AND status = 'running' AND locked_by = ?",
+            (status, error, available_at, now, job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def _run_job(job: Job) -> Dict[str, Any]:
+    # imported here so only worker processes pay for the LLM dependencies
+    from diet_generation.pipelines.diet_pipeline import DietPipeline
+
+    meals_plan = DietPipeline(UserData.from_dict(job.payload)).generate()
+    return asdict(meals_plan)
+
+
+def _worker_loop(db_path: Path, poll_interval: float) -> None:
+    """
+    Takes jobs from the queue and runs them until the process is stopped.
+    """
+    logging.basicConfig(level=logging.INFO)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(db_path)
+    log.info(f"Worker {worker_id} started")
+
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        log.info(f"Worker {worker_id} running job {job.id} (attempt {job.attempts})")
+        try:
+            result = _run_job(job)
+        except Exception as e:
+            log.warning(f"Job {job.id} failed on attempt {job.attempts}: {e}")
+            recorded = queue.fail(job.id, worker_id, f"{type(e).__name__}: {e}")
+        else:
+            recorded = queue.complete(job.id, worker_id, result)
+            log.info(f"Job {job.id} done")
+        if not recorded:
+            log.warning(f"The lease of job {job.id} expired, the outcome of this attempt was discarded")
+
+
+def run_workers(
+    workers: int | None = None,
+    db_path: Path | None = None,
+    poll_interval: float = 1.0,
+) -> None:
+    """
+    Starts a pool of worker processes consuming the queue and blocks until
+    it's interrupted. The number of workers bounds how many plans are
+    generated at the same time, and therefore the load on the LLM and
+    FatSecret quotas.
+    """
+    workers = workers or settings.job_workers
+    db_path = Path(db_path or settings.jobs_database_file)
+    JobQueue(db_path).close()   # creates the schema before the workers race for it
+
+    processes = [
+        multiprocessing.Process(target=_worker_loop, args=(db_path, poll_interval), daemon=True)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    log.info(f"Started {workers} workers on {db_path}")
+
+    try:
+        while True:
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    log.warning(f"Worker {process.pid} died with code {process.exitcode}, restarting it")
+                    processes[i] = multiprocessing.Process(
+                        target=_worker_loop, args=(db_path, poll_interval), daemon=True
+                    )
+                    processes[i].start()
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        log.info("Stopping workers")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
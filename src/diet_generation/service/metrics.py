@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent request latencies of each endpoint and
+    summarizes them as percentiles, so the cost of every request in a
+    long-lived process can be monitored.
+    """
+
+    def __init__(self, window: int = 1000) -> "LatencyTracker":
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        """
+        Records the latency (in seconds) of one request to the endpoint.
+        """
+        with self._lock:
+            samples = self._samples.setdefault(endpoint, deque(maxlen=self.window))
+            samples.append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+
+    @staticmethod
+    def _percentile(sorted_samples: list[float], q: float) -> float:
+        """
+        Nearest-rank percentile of an already sorted list of samples.
+        """
+        index = max(int(round(q / 100 * len(sorted_samples))) - 1, 0)
+        return sorted_samples[min(index, len(sorted_samples) - 1)]
+
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns, for each endpoint, the total number of requests and the
+        p50/p95/p99 and mean latencies (in milliseconds) of the samples
+        in the window.
+        """
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            counts = dict(self._counts)
+
+        summary = {}
+        for name, samples in snapshot.items():
+            summary[name] = {
+                "count": counts[name],
+                "p50_ms": round(self._percentile(samples, 50) * 1000, 2),
+                "p95_ms": round(self._percentile(samples, 95) * 1000, 2),
+                "p99_ms": round(self._percentile(samples, 99) * 1000, 2),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 2),
+            }
+        return summary
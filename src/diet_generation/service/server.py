@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Tuple
+from urllib.parse import urlsplit
+
+from diet_generation.config.settings import get_settings
+from diet_generation.diet.fatsecret_client import get_fatsecret_client
+from diet_generation.diet.meals_plan_llm import get_chat_model
+from diet_generation.pipelines.diet_pipeline import DietPipeline
+from diet_generation.service.metrics import LatencyTracker
+from diet_generation.user.types import UserData
+from diet_generation.user.user import User
+from diet_generation.utils.io import _load_food_database, _to_jsonable
+
+log = logging.getLogger(__name__)
+
+
+class InvalidRequestError(ValueError):
+    """
+    Raised when the payload of a request isn't valid, it's answered with
+    a 400. Any other error while handling a request is a 500.
+    """
+
+
+def _user_data(payload: dict) -> UserData:
+    try:
+        return UserData.from_dict(payload)
+    except (KeyError, ValueError, TypeError) as e:
+        raise InvalidRequestError(f"Invalid user data: {e!r}") from e
+
+
+class PlanService:
+    """
+    Keeps everything a plan generation needs resident in memory (settings,
+    food database and API clients), so each request only pays for the work
+    it actually does. Latencies of every endpoint are tracked.
+    """
+
+    def __init__(self) -> "PlanService":
+        self.latencies = LatencyTracker()
+        self.routes: Dict[Tuple[str, str], Callable[[dict], Any]] = {
+            ("GET", "/health"): lambda _: {"status": "ok"},
+            ("GET", "/stats"): lambda _: self.latencies.summary(),
+            ("POST", "/macros"): self.calculate_macros,
+            ("POST", "/meals-plan"): self.generate_meals_plan,
+        }
+
+
+    def warm_up(self) -> None:
+        """
+        Loads the settings, the food database and the API clients once,
+        before the first request arrives.
+        """
+        started = time.perf_counter()
+        get_settings()
+        food_db = _load_food_database()
+        get_chat_model()
+        try:
+            get_fatsecret_client()._access_token()
+        except Exception as e:
+            log.warning(f"Couldn't fetch the FatSecret token at startup: {e}")
+        log.info(f"Service warmed up in {time.perf_counter() - started:.2f}s "
+                 f"({len(food_db)} foods loaded)")
+
+
+    def calculate_macros(self, payload: dict) -> dict:
+        user = User(_user_data(payload))
+        return {"user": user.identifier, "macros": asdict(user.macros)}
+
+
+    def generate_meals_plan(self, payload: dict) -> dict:
+        meals_plan = DietPipeline(_user_data(payload)).generate()
+        return asdict(meals_plan)
+
+
+    def handle(self, method: str, path: str, payload: dict) -> Tuple[int, Any]:
+        """
+        Dispatches a request to its endpoint, returning the status code
+        and the body of the response. The query string isn't used.
+        """
+        path = urlsplit(path).path
+        route = self.routes.get((method, path))
+        if route is None:
+            return 404, {"error": f"Unknown endpoint {method} {path}"}
+
+        started = time.perf_counter()
+        try:
+            return 200, route(payload)
+        except InvalidRequestError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            log.exception(f"Request {method} {path} failed")
+            return 500, {"error": str(e)}
+        finally:
+            self.latencies.record(path, time.perf_counter() - started)
+
+
+def _make_handler(service: PlanService) -> type[BaseHTTPRequestHandler]:
+    class PlanRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self, method: str) -> None:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length)) if length else {}
+            except json.JSONDecodeError as e:
+                status, body = 400, {"error": f"Invalid JSON body: {e}"}
+            else:
+                status, body = service.handle(method, self.path, payload)
+
+            data = json.dumps(_to_jsonable(body)).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            self._respond("GET")
+
+        def do_POST(self) -> None:
+            self._respond("POST")
+
+        def log_message(self, format: str, *args) -> None:
+            log.info(f"{self.address_string()} - {format % args}")
+
+    return PlanRequestHandler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000) -> None:
+    """
+    Starts the plan generation service and blocks until it's interrupted.
+    """
+    service = PlanService()
+    service.warm_up()
+
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    log.info(f"Serving plan generation on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Shutting down the plan generation service")
+    finally:
+        server.server_close()
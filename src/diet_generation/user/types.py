@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 
 @dataclass(frozen=True)
@@ -53,3 +53,40 @@ class UserData:
     condition: Optional[List[str]] = None  # e.g., 'diabetic', 'celiac', etc.
     diet_type: Optional[DietType] = DietType.omnivore
     notes: Optional[str] = None  # any additional info or constraints
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UserData":
+        """
+        Builds the user data from a plain dict (e.g. a JSON payload), converting
+        the enum fields from their string values. `condition` may be given as a
+        list or as a comma separated string. Raises TypeError when `data` isn't
+        a dict, like KeyError/ValueError for missing or invalid fields, so
+        callers (the service, `jobs submit`) can report any of them as bad input:
+
+        >>> UserData.from_dict([1])
+        Traceback (most recent call last):
+        ...
+        TypeError: The user data must be a JSON object, not list
+        """
+        if not isinstance(data, dict):
+            raise TypeError(f"The user data must be a JSON object, not {type(data).__name__}")
+
+        condition = data.get("condition")
+        if isinstance(condition, str):
+            condition = [c.strip() for c in condition.split(",") if c.strip()] or None
+
+        return cls(
+            name=data["name"],
+            lastname=data["lastname"],
+            age=int(data["age"]),
+            weight=float(data["weight"]),
+            height=float(data["height"]),
+            sex=Sex(data["sex"]),
+            activity_level=ActivityLevel(data["activity_level"]),
+            implementation=Implementation(data["implementation"]),
+            goal=Goal(data["goal"]),
+            training_days=int(data["training_days"]),
+            condition=condition,
+            diet_type=DietType(data.get("diet_type") or DietType.omnivore),
+            notes=data.get("notes"),
+        )
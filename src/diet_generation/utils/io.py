@@ -1,18 +1,98 @@
+import fcntl
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Tuple
+
 import pandas as pd
 
 from diet_generation.config.settings import Settings, get_settings
+from diet_generation.diet.shared_food_table import attach_food_table
 
 
 settings: Settings = get_settings()
 
+_food_db_lock = threading.Lock()
+_food_db_cache: Optional[Tuple[Tuple[int, int, int], pd.DataFrame]] = None
+_food_db_write_lock = threading.Lock()
+
 
 def _load_food_database() -> pd.DataFrame:
     """
     Loads the csv file with food's data by reading the file in settings.
+
+    The parsed table is kept in memory and reused until the file changes
+    on disk (its size, modification time or inode), so long-lived processes
+    don't re-parse the csv for every plan. The returned DataFrame is shared, so
+    callers must treat it as read-only.
+
+    With `food_db_shared_snapshot` enabled, the table is attached from the
+    memory-mapped snapshot shared by all the processes instead.
     """
+    global _food_db_cache
+
+    if settings.food_db_shared_snapshot:
+        return attach_food_table().frame
+
     if not settings.food_database_file.exists():
         raise ValueError("The food database file wans't found. " \
             "Confirm that the file was generated first by calling " \
             "the endpoint `generate-food-database`.")
-            
-    return pd.read_csv(settings.food_database_file)
\ No newline at end of file
+
+    stat = settings.food_database_file.stat()
+    signature = (stat.st_mtime_ns, stat.st_size, stat.st_ino)     # writes replace the file
+
+    with _food_db_lock:
+        if _food_db_cache is None or _food_db_cache[0] != signature:
+            _food_db_cache = (signature, pd.read_csv(settings.food_database_file))
+        return _food_db_cache[1]
+
+
+@contextmanager
+def _food_database_write_lock() -> Iterator[None]:
+    """
+    Serializes the read-modify-write cycles on the food database, between
+    the threads of this process and between processes (the API server, the
+    job workers and the CLI may update it at the same time). Callers must
+    re-read the csv once the lock is held.
+    """
+    path = settings.food_database_file
+    lock_path = path.with_name(path.name + ".lock")
+    with _food_db_write_lock, lock_path.open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_food_database(df: pd.DataFrame) -> None:
+    """
+    Writes the food database atomically: the csv is written to a temporary
+    file that then replaces the current one, so readers never see a
+    partially written database. Use it inside `_food_database_write_lock`.
+    """
+    if "food_id" in df.columns:
+        df = df.astype({"food_id": "Int64"})    # keeps ids as integers next to missing ones
+
+    path = settings.food_database_file
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def _to_jsonable(value: Any) -> Any:
+    """
+    Converts the values of a serialized dataclass into plain JSON types.
+    Missing nutritional values (NaN, as read from the csv) become null.
+    """
+    if isinstance(value, dict):
+        return {key: _to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_jsonable(item) for item in value]
+    if hasattr(value, "item"):     # numpy scalars
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value